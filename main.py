@@ -1,51 +1,158 @@
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse, StreamingResponse
+import asyncio
+import aiosqlite
 import sqlite3
-import json
+import orjson
 import base64
-import requests
+import httpx
 import logging
-from datetime import datetime
+import logging.handlers
 import contextlib
+import os
+import queue
+import time
+from cachetools import TTLCache
 
 # ── Configuration ────────────────────────────────────────────────
 WALLET_ADDRESS   = "0x0F330101B2eA5347AEBAF4257eE46e1355d2F953"
 USDC_CONTRACT    = "0x833589fCD6eDb6E08f4c7C32D4f71b54bdA02913"
 NETWORK_ID       = "8453"          # Base mainnet
 FACILITATOR_URL  = "https://x402.org/facilitator"
+PUBLIC_URL       = "https://agent-directory.life.conway.tech"
 REGISTER_PRICE   = 500000          # 0.50 USDC (6 decimals)
 SEARCH_PRICE     = 10000           # 0.01 USDC (6 decimals)
-DB_PATH          = "/root/agents.db"
+DB_PATH          = os.environ.get("AGENT_DIRECTORY_DB", "/root/agents.db")
+WORKERS          = int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1))
+# Pooled read connections per worker (plus one writer). Every connection is
+# a thread with its own page cache, so multi-worker deployments keep one.
+DB_READERS       = int(os.environ.get("AGENT_DIRECTORY_DB_READERS", 8 if WORKERS == 1 else 1))
+VERIFY_CACHE_TTL = 60              # seconds a successful verification is reused
+REPLAY_WINDOW    = 900             # seconds a spent payment stays in the in-process cache
+TX_BATCH_SIZE    = 100             # max transaction rows per log commit
+TX_FLUSH_DELAY   = 0.05            # seconds the log writer waits to fill a batch
+HEALTH_CACHE_TTL = 5               # seconds a /health snapshot is served
+SEARCH_CHUNK     = 100             # rows encoded per streamed /search chunk
 
 # ── Logging ──────────────────────────────────────────────────────
+# Handlers only enqueue formatted records; a listener thread started on
+# startup does the file and console writes off the event loop.
+_log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+_log_listener = logging.handlers.QueueListener(
+    _log_queue,
+    logging.FileHandler("/root/api.log"),
+    logging.StreamHandler()
+)
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[
-        logging.FileHandler("/root/api.log"),
-        logging.StreamHandler()
-    ]
+    handlers=[logging.handlers.QueueHandler(_log_queue)]
 )
 logger = logging.getLogger(__name__)
 
 # ── App ───────────────────────────────────────────────────────────
 app = FastAPI(title="AI Agent Directory", version="1.0.0",
-              description="B2A monetized directory of AI agents. Pay per use via x402.")
+              description="B2A monetized directory of AI agents. Pay per use via x402.",
+              default_response_class=ORJSONResponse)
 
 # ── Database ─────────────────────────────────────────────────────
-@contextlib.contextmanager
-def get_db():
-    conn = sqlite3.connect(DB_PATH)
+DB_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-64000",
+)
+
+# Statements are kept as constants so each call site hits sqlite3's
+# statement cache with an identical string.
+SQL_INSERT_AGENT = (
+    "INSERT INTO agents (name, description, payment_endpoint, registered_at)"
+    " VALUES (?, ?, ?, ?)"
+    " ON CONFLICT(name) DO NOTHING RETURNING id"
+)
+SQL_INSERT_TX = (
+    "INSERT INTO transactions (endpoint, payment_hash, amount_usdc, timestamp, status)"
+    " VALUES (?, ?, ?, ?, ?)"
+)
+SQL_SEARCH_FTS = (
+    "SELECT a.id, a.name, a.description, a.payment_endpoint, a.registered_at"
+    " FROM agents_fts f JOIN agents a ON a.id = f.rowid"
+    " WHERE agents_fts MATCH ?"
+)
+SQL_SEARCH_LIKE = (
+    "SELECT id, name, description, payment_endpoint, registered_at FROM agents"
+    " WHERE name LIKE ? OR description LIKE ?"
+)
+SQL_SEARCH_ALL = (
+    "SELECT id, name, description, payment_endpoint, registered_at FROM agents"
+)
+SQL_CLAIM_PAYMENT = (
+    "INSERT INTO spent_payments (pay_id, resource, spent_at) VALUES (?, ?, ?)"
+    " ON CONFLICT DO NOTHING RETURNING 1"
+)
+SQL_PAYMENT_SPENT = (
+    "SELECT 1 FROM spent_payments WHERE pay_id = ? AND resource = ?"
+)
+SQL_HEALTH = (
+    "SELECT (SELECT COUNT(*) FROM agents),"
+    " (SELECT COUNT(*) FROM transactions WHERE status='success'),"
+    " (SELECT COALESCE(SUM(amount_usdc), 0) FROM transactions WHERE status='success')"
+)
+
+# Each aiosqlite connection runs its queries on its own thread, so the event
+# loop never blocks on SQLite I/O.
+_read_pool: "asyncio.Queue[aiosqlite.Connection] | None" = None
+_write_conn: aiosqlite.Connection | None = None
+_write_lock: asyncio.Lock | None = None
+
+async def _connect() -> aiosqlite.Connection:
+    conn = await aiosqlite.connect(DB_PATH)
     conn.row_factory = sqlite3.Row
+    for pragma in DB_PRAGMAS:
+        await conn.execute(pragma)
+    return conn
+
+async def open_db():
+    global _read_pool, _write_conn, _write_lock
+    _read_pool  = asyncio.Queue()
+    _write_lock = asyncio.Lock()
+    _write_conn = await _connect()
+    for _ in range(DB_READERS):
+        _read_pool.put_nowait(await _connect())
+
+async def close_db():
+    global _write_conn
+    while not _read_pool.empty():
+        await _read_pool.get_nowait().close()
+    if _write_conn is not None:
+        await _write_conn.close()
+        _write_conn = None
+
+@contextlib.asynccontextmanager
+async def get_db(write: bool = False):
+    if write:
+        async with _write_lock:
+            try:
+                yield _write_conn
+                await _write_conn.commit()
+            except BaseException:
+                await _write_conn.rollback()
+                raise
+        return
+    conn = await _read_pool.get()
     try:
         yield conn
-        conn.commit()
     finally:
-        conn.close()
+        _read_pool.put_nowait(conn)
 
-def init_db():
-    with get_db() as conn:
-        conn.executescript("""
+async def init_db():
+    await open_db()
+    async with get_db(write=True) as conn:
+        async with conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='agents_fts'"
+        ) as cur:
+            fts_exists = await cur.fetchone()
+        await conn.executescript("""
             CREATE TABLE IF NOT EXISTS agents (
                 id               INTEGER PRIMARY KEY AUTOINCREMENT,
                 name             TEXT NOT NULL UNIQUE,
@@ -61,9 +168,43 @@ def init_db():
                 timestamp    TEXT    NOT NULL,
                 status       TEXT
             );
+            CREATE TABLE IF NOT EXISTS spent_payments (
+                pay_id   TEXT NOT NULL,
+                resource TEXT NOT NULL,
+                spent_at TEXT NOT NULL,
+                PRIMARY KEY (pay_id, resource)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_tx_status
+                ON transactions(status, amount_usdc);
+            CREATE VIRTUAL TABLE IF NOT EXISTS agents_fts USING fts5(
+                name, description,
+                content='agents', content_rowid='id', tokenize='unicode61'
+            );
+            CREATE TRIGGER IF NOT EXISTS agents_fts_ai AFTER INSERT ON agents BEGIN
+                INSERT INTO agents_fts (rowid, name, description)
+                VALUES (new.id, new.name, new.description);
+            END;
+            CREATE TRIGGER IF NOT EXISTS agents_fts_ad AFTER DELETE ON agents BEGIN
+                INSERT INTO agents_fts (agents_fts, rowid, name, description)
+                VALUES ('delete', old.id, old.name, old.description);
+            END;
+            CREATE TRIGGER IF NOT EXISTS agents_fts_au AFTER UPDATE ON agents BEGIN
+                INSERT INTO agents_fts (agents_fts, rowid, name, description)
+                VALUES ('delete', old.id, old.name, old.description);
+                INSERT INTO agents_fts (rowid, name, description)
+                VALUES (new.id, new.name, new.description);
+            END;
         """)
+        if not fts_exists:
+            # Index agents registered before the FTS table existed.
+            await conn.execute("INSERT INTO agents_fts (agents_fts) VALUES ('rebuild')")
     logger.info("Database initialized at %s", DB_PATH)
 
+def fts_query(q: str) -> str:
+    """Turn free text into an FTS5 query of quoted prefix terms (implicit AND)."""
+    terms = [t for t in q.replace("-", " ").split() if any(ch.isalnum() for ch in t)]
+    return " ".join('"' + t.replace('"', '""') + '"*' for t in terms)
+
 # ── x402 helpers ─────────────────────────────────────────────────
 def build_requirements(resource_url: str, amount: int, description: str) -> dict:
     return {
@@ -81,61 +222,196 @@ def build_requirements(resource_url: str, amount: int, description: str) -> dict
     }
 
 def requirements_header(requirements: dict) -> str:
-    return base64.b64encode(json.dumps(requirements).encode()).decode()
+    return base64.b64encode(orjson.dumps(requirements)).decode("ascii")
+
+# Requirements depend only on configuration, so build them once per route.
+REGISTER_REQS = build_requirements(PUBLIC_URL + "/register", REGISTER_PRICE,
+                                   "Register agent in AI Directory — 0.50 USDC")
+REGISTER_HDR  = requirements_header(REGISTER_REQS)
+SEARCH_REQS   = build_requirements(PUBLIC_URL + "/search", SEARCH_PRICE,
+                                   "Search AI Agent Directory — 0.01 USDC")
+SEARCH_HDR    = requirements_header(SEARCH_REQS)
+
+# Shared keep-alive client for facilitator calls; opened on startup.
+http_client: httpx.AsyncClient | None = None
+
+def decode_payment(payment_header: str) -> dict | None:
+    try:
+        payload = orjson.loads(base64.b64decode(payment_header))
+    except ValueError:
+        return None
+    return payload if isinstance(payload, dict) else None
 
-def verify_payment(payment_header: str, requirements: dict) -> tuple[bool, str]:
+def payment_id(payload: dict) -> str | None:
+    """Identity of the signed EIP-3009 authorization, as "<from>:<nonce>".
+
+    Only signed fields count, so re-wrapping a spent payment in a different
+    envelope yields the same id. None if the authorization is missing.
+    """
+    try:
+        auth   = payload["payload"]["authorization"]
+        sender = auth["from"]
+        nonce  = auth["nonce"]
+    except (KeyError, TypeError):
+        return None
+    if not (isinstance(sender, str) and isinstance(nonce, str) and sender and nonce):
+        return None
+    return f"{sender.lower()}:{nonce.lower()}"
+
+# pay_id -> (tx_hash, resource) for payments the facilitator accepted
+_verified: TTLCache = TTLCache(maxsize=4096, ttl=VERIFY_CACHE_TTL)
+
+async def verify_payment(payload: dict, pay_id: str, requirements: dict) -> tuple[bool, str]:
+    cached = _verified.get(pay_id)
+    if cached is not None:
+        tx_hash, resource = cached
+        if resource != requirements["resource"]:
+            logger.warning("Payment %s replayed against %s", tx_hash, requirements["resource"])
+            return False, tx_hash
+        return True, tx_hash
     try:
-        payload = json.loads(base64.b64decode(payment_header).decode())
-        resp = requests.post(
+        resp = await http_client.post(
             f"{FACILITATOR_URL}/verify",
-            json={"payment": payload, "paymentRequirements": requirements},
-            timeout=10
+            content=orjson.dumps({"payment": payload, "paymentRequirements": requirements}),
+            headers={"Content-Type": "application/json"}
         )
         if resp.status_code == 200:
-            data = resp.json()
-            return data.get("isValid", False), data.get("txHash", "unverified")
+            data    = orjson.loads(resp.content)
+            valid   = data.get("isValid", False)
+            tx_hash = data.get("txHash", "unverified")
+            if valid:
+                _verified[pay_id] = (tx_hash, requirements["resource"])
+            return valid, tx_hash
     except Exception as exc:
         logger.error("Payment verification failed: %s", exc)
     return False, ""
 
-def log_tx(endpoint: str, tx_hash: str, amount: float, status: str):
-    with get_db() as conn:
-        conn.execute(
-            "INSERT INTO transactions (endpoint, payment_hash, amount_usdc, timestamp, status)"
-            " VALUES (?, ?, ?, ?, ?)",
-            (endpoint, tx_hash, amount, datetime.utcnow().isoformat(), status)
-        )
+# Spent payments live in SQLite so every worker process sees them; this
+# cache only spares repeat lookups of payments already known to be spent.
+_spent: TTLCache = TTLCache(maxsize=100_000, ttl=REPLAY_WINDOW)
+
+async def payment_spent(pay_id: str, requirements: dict) -> bool:
+    key = (pay_id, requirements["resource"])
+    if key in _spent:
+        return True
+    async with get_db() as conn, conn.execute(SQL_PAYMENT_SPENT, key) as cur:
+        spent = await cur.fetchone() is not None
+    if spent:
+        _spent[key] = True
+    return spent
+
+async def claim_payment(conn: aiosqlite.Connection, pay_id: str, requirements: dict,
+                        timestamp: str) -> bool:
+    """Record the payment as spent in the caller's write transaction.
+
+    False if it was already spent, e.g. by a concurrent request on another
+    worker. The claim commits or rolls back with the rest of the transaction.
+    """
+    async with conn.execute(
+        SQL_CLAIM_PAYMENT, (pay_id, requirements["resource"], timestamp)
+    ) as cur:
+        return await cur.fetchone() is not None
+
+# ── Transaction log ──────────────────────────────────────────────
+# Rows are queued by the request handlers and committed in batches by a
+# single writer task, so a paid call never waits on its own log fsync.
+_tx_queue: "asyncio.Queue[tuple | None] | None" = None
+_tx_writer: asyncio.Task | None = None
+
+def utc_timestamp() -> str:
+    """Second-resolution ISO 8601 UTC time, e.g. 2026-02-23T02:41:34."""
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime())
+
+# payment_hash holds the payment's pay_id (see payment_id), so every row for
+# one payment -- success, duplicate, replay -- joins on the same value.
+def tx_row(endpoint: str, pay_id: str, amount: float, status: str,
+           timestamp: str | None = None) -> tuple:
+    return (endpoint, pay_id, amount, timestamp or utc_timestamp(), status)
+
+async def insert_txs(conn: aiosqlite.Connection, rows: list[tuple]):
+    await conn.executemany(SQL_INSERT_TX, rows)
+
+def log_tx(endpoint: str, pay_id: str, amount: float, status: str):
+    _tx_queue.put_nowait(tx_row(endpoint, pay_id, amount, status))
+
+async def flush_txs(batch: list[tuple]):
+    try:
+        async with get_db(write=True) as conn:
+            await insert_txs(conn, batch)
+    except Exception as exc:
+        logger.error("Dropped %d transaction log rows: %s", len(batch), exc)
+
+async def tx_writer():
+    """Commit queued rows in batches until a None sentinel is dequeued."""
+    while True:
+        batch = [await _tx_queue.get()]
+        # Unless a full batch is already waiting, linger so rows from
+        # concurrent requests share one executemany and one WAL commit.
+        if batch[0] is not None and _tx_queue.qsize() < TX_BATCH_SIZE - 1:
+            await asyncio.sleep(TX_FLUSH_DELAY)
+        while len(batch) < TX_BATCH_SIZE and not _tx_queue.empty():
+            batch.append(_tx_queue.get_nowait())
+        rows = [row for row in batch if row is not None]
+        if rows:
+            await flush_txs(rows)
+        if len(rows) < len(batch):
+            return
 
 # ── Startup ───────────────────────────────────────────────────────
 @app.on_event("startup")
 async def startup():
-    init_db()
+    global http_client, _tx_queue, _tx_writer
+    _log_listener.start()
+    await init_db()
+    _tx_queue  = asyncio.Queue()
+    _tx_writer = asyncio.create_task(tx_writer())
+    http_client = httpx.AsyncClient(
+        http2=True, timeout=10,
+        limits=httpx.Limits(max_keepalive_connections=32)
+    )
     logger.info("Conway Automaton — Agent Directory API is LIVE")
 
+@app.on_event("shutdown")
+async def shutdown():
+    await http_client.aclose()
+    _tx_queue.put_nowait(None)
+    await _tx_writer
+    await close_db()
+    _log_listener.stop()
+
 # ── POST /register ────────────────────────────────────────────────
 @app.post("/register")
 async def register_agent(request: Request):
-    resource_url  = "https://agent-directory.life.conway.tech" + str(request.url.path)
-    requirements  = build_requirements(resource_url, REGISTER_PRICE,
-                                       "Register agent in AI Directory — 0.50 USDC")
-    payment_hdr   = request.headers.get("X-PAYMENT")
+    payment_hdr = request.headers.get("X-PAYMENT")
 
     if not payment_hdr:
-        logger.info("POST /register — 402 issued (no payment header)")
-        return JSONResponse(
+        logger.debug("POST /register — 402 issued (no payment header)")
+        return ORJSONResponse(
             status_code=402,
             content={"error": "Payment required", "price_usdc": 0.50},
-            headers={"X-PAYMENT-REQUIREMENTS": requirements_header(requirements)}
+            headers={"X-PAYMENT-REQUIREMENTS": REGISTER_HDR}
         )
 
-    valid, tx_hash = verify_payment(payment_hdr, requirements)
+    payload = decode_payment(payment_hdr)
+    pay_id  = payment_id(payload) if payload is not None else None
+    if pay_id is None:
+        log_tx("/register", "", 0.50, "invalid")
+        return ORJSONResponse(status_code=402, content={"error": "Invalid or insufficient payment"})
+
+    # Replays are refused before they cost a facilitator round-trip.
+    if await payment_spent(pay_id, REGISTER_REQS):
+        log_tx("/register", pay_id, 0.50, "replay")
+        logger.warning("POST /register — replayed payment rejected | pay_id=%s", pay_id)
+        return ORJSONResponse(status_code=409, content={"error": "Payment already used"})
+
+    valid, tx_hash = await verify_payment(payload, pay_id, REGISTER_REQS)
     if not valid:
-        log_tx("/register", tx_hash, 0.50, "invalid")
+        log_tx("/register", pay_id, 0.50, "invalid")
         logger.warning("POST /register — invalid payment rejected")
-        return JSONResponse(status_code=402, content={"error": "Invalid or insufficient payment"})
+        return ORJSONResponse(status_code=402, content={"error": "Invalid or insufficient payment"})
 
     try:
-        body             = await request.json()
+        body             = orjson.loads(await request.body())
         name             = body.get("name", "").strip()
         description      = body.get("description", "").strip()
         payment_endpoint = body.get("payment_endpoint", "").strip()
@@ -144,24 +420,37 @@ async def register_agent(request: Request):
             raise HTTPException(status_code=400,
                                 detail="Required fields: name, description, payment_endpoint")
 
-        with get_db() as conn:
-            cur = conn.execute(
-                "INSERT INTO agents (name, description, payment_endpoint, registered_at)"
-                " VALUES (?, ?, ?, ?)",
-                (name, description, payment_endpoint, datetime.utcnow().isoformat())
-            )
-            agent_id = cur.lastrowid
+        # The payment is claimed in the same transaction as the agent row, so a
+        # duplicate name or a failed write leaves it usable for a retry.
+        now = utc_timestamp()
+        async with get_db(write=True) as conn:
+            async with conn.execute(
+                SQL_INSERT_AGENT,
+                (name, description, payment_endpoint, now)
+            ) as cur:
+                row = await cur.fetchone()
+            if row is None:
+                status = "duplicate"
+            elif await claim_payment(conn, pay_id, REGISTER_REQS, now):
+                status = "success"
+            else:
+                await conn.rollback()
+                status = "replay"
+            await conn.execute(SQL_INSERT_TX, tx_row("/register", pay_id, 0.50, status, now))
+
+        if status == "replay":
+            logger.warning("POST /register — replayed payment rejected | pay_id=%s", pay_id)
+            return ORJSONResponse(status_code=409, content={"error": "Payment already used"})
+        if status == "duplicate":
+            raise HTTPException(status_code=409, detail="Agent name already registered")
 
-        log_tx("/register", tx_hash, 0.50, "success")
+        agent_id = row[0]
         logger.info("REGISTER OK | agent=%s | id=%s | tx=%s", name, agent_id, tx_hash)
         return {"success": True, "agent_id": agent_id,
                 "message": f"Agent '{name}' registered. tx: {tx_hash}"}
 
     except HTTPException:
         raise
-    except sqlite3.IntegrityError:
-        log_tx("/register", tx_hash, 0.50, "duplicate")
-        raise HTTPException(status_code=409, detail="Agent name already registered")
     except Exception as exc:
         logger.error("Register error: %s", exc)
         raise HTTPException(status_code=500, detail="Internal server error")
@@ -169,52 +458,95 @@ async def register_agent(request: Request):
 # ── GET /search ───────────────────────────────────────────────────
 @app.get("/search")
 async def search_agents(request: Request, q: str = ""):
-    resource_url  = "https://agent-directory.life.conway.tech" + str(request.url.path)
-    requirements  = build_requirements(resource_url, SEARCH_PRICE,
-                                       "Search AI Agent Directory — 0.01 USDC")
-    payment_hdr   = request.headers.get("X-PAYMENT")
+    payment_hdr = request.headers.get("X-PAYMENT")
 
     if not payment_hdr:
-        logger.info("GET /search — 402 issued (no payment header)")
-        return JSONResponse(
+        logger.debug("GET /search — 402 issued (no payment header)")
+        return ORJSONResponse(
             status_code=402,
             content={"error": "Payment required", "price_usdc": 0.01},
-            headers={"X-PAYMENT-REQUIREMENTS": requirements_header(requirements)}
+            headers={"X-PAYMENT-REQUIREMENTS": SEARCH_HDR}
         )
 
-    valid, tx_hash = verify_payment(payment_hdr, requirements)
+    payload = decode_payment(payment_hdr)
+    pay_id  = payment_id(payload) if payload is not None else None
+    if pay_id is None:
+        log_tx("/search", "", 0.01, "invalid")
+        return ORJSONResponse(status_code=402, content={"error": "Invalid or insufficient payment"})
+
+    # Replays are refused before they cost a facilitator round-trip.
+    if await payment_spent(pay_id, SEARCH_REQS):
+        log_tx("/search", pay_id, 0.01, "replay")
+        logger.warning("GET /search — replayed payment rejected | pay_id=%s", pay_id)
+        return ORJSONResponse(status_code=409, content={"error": "Payment already used"})
+
+    valid, tx_hash = await verify_payment(payload, pay_id, SEARCH_REQS)
     if not valid:
-        log_tx("/search", tx_hash, 0.01, "invalid")
-        return JSONResponse(status_code=402, content={"error": "Invalid or insufficient payment"})
-
-    with get_db() as conn:
-        if q:
-            rows = conn.execute(
-                "SELECT id, name, description, payment_endpoint, registered_at FROM agents"
-                " WHERE name LIKE ? OR description LIKE ?",
-                (f"%{q}%", f"%{q}%")
-            ).fetchall()
-        else:
-            rows = conn.execute(
-                "SELECT id, name, description, payment_endpoint, registered_at FROM agents"
-            ).fetchall()
-
-    results = [dict(r) for r in rows]
-    log_tx("/search", tx_hash, 0.01, "success")
-    logger.info("SEARCH OK | q='%s' | results=%d | tx=%s", q, len(results), tx_hash)
-    return {"results": results, "count": len(results), "query": q}
+        log_tx("/search", pay_id, 0.01, "invalid")
+        return ORJSONResponse(status_code=402, content={"error": "Invalid or insufficient payment"})
+
+    try:
+        rows = await fetch_search(q)
+    except Exception as exc:
+        logger.error("Search error: %s", exc)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+    # Claimed only after the query succeeded, so a 500 leaves the payment usable.
+    # The transaction row commits with the claim, before any body bytes go out,
+    # so a client that disconnects mid-stream is still on the books.
+    now = utc_timestamp()
+    async with get_db(write=True) as conn:
+        claimed = await claim_payment(conn, pay_id, SEARCH_REQS, now)
+        status  = "success" if claimed else "replay"
+        await conn.execute(SQL_INSERT_TX, tx_row("/search", pay_id, 0.01, status, now))
+    if not claimed:
+        logger.warning("GET /search — replayed payment rejected | pay_id=%s", pay_id)
+        return ORJSONResponse(status_code=409, content={"error": "Payment already used"})
+
+    logger.info("SEARCH OK | q='%s' | results=%d | tx=%s", q, len(rows), tx_hash)
+    return StreamingResponse(stream_search(rows, q), media_type="application/json")
+
+async def fetch_search(q: str) -> list[sqlite3.Row]:
+    """Run the search to completion so errors surface before the 200 is sent.
+
+    The pooled reader (and its WAL snapshot) is released before streaming,
+    so a slow client never holds a connection.
+    """
+    match = fts_query(q)
+    if match:
+        sql, params = SQL_SEARCH_FTS, (match,)
+    elif q:
+        # Nothing tokenizable (e.g. bare punctuation or LIKE wildcards):
+        # fall back to a substring scan.
+        like = f"%{q}%"
+        sql, params = SQL_SEARCH_LIKE, (like, like)
+    else:
+        sql, params = SQL_SEARCH_ALL, ()
+
+    async with get_db() as conn, conn.execute(sql, params) as cur:
+        return await cur.fetchall()
+
+async def stream_search(rows: list[sqlite3.Row], q: str):
+    """Encode rows SEARCH_CHUNK at a time instead of building one list of dicts."""
+    yield b'{"results":['
+    for i in range(0, len(rows), SEARCH_CHUNK):
+        chunk = b",".join(orjson.dumps(dict(r)) for r in rows[i:i + SEARCH_CHUNK])
+        yield chunk if not i else b"," + chunk
+    yield b'],"count":%d,"query":%s}' % (len(rows), orjson.dumps(q))
 
 # ── GET /health ───────────────────────────────────────────────────
+_cached_health: dict | None = None
+_cached_at = 0.0
+
 @app.get("/health")
 async def health():
-    with get_db() as conn:
-        agent_count = conn.execute("SELECT COUNT(*) FROM agents").fetchone()[0]
-        row         = conn.execute(
-            "SELECT COUNT(*), COALESCE(SUM(amount_usdc), 0)"
-            " FROM transactions WHERE status='success'"
-        ).fetchone()
-    tx_count, revenue = row[0], row[1]
-    return {
+    global _cached_health, _cached_at
+    if _cached_health is not None and time.monotonic() - _cached_at < HEALTH_CACHE_TTL:
+        return _cached_health
+    async with get_db() as conn:
+        async with conn.execute(SQL_HEALTH) as cur:
+            agent_count, tx_count, revenue = await cur.fetchone()
+    _cached_health = {
         "status"              : "operational",
         "agents_registered"   : agent_count,
         "total_transactions"  : tx_count,
@@ -222,6 +554,8 @@ async def health():
         "wallet"              : WALLET_ADDRESS,
         "network"             : f"Base (chainId {NETWORK_ID})"
     }
+    _cached_at = time.monotonic()
+    return _cached_health
 
 # ── GET / (info) ──────────────────────────────────────────────────
 @app.get("/")
@@ -242,4 +576,9 @@ async def root():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, log_level="info")
+    # Each worker process opens its own SQLite connections on startup. WAL
+    # lets /health and the search queries read in parallel, but every paid
+    # call also commits one write (payment claim + transaction row), and
+    # those serialize on the database write lock across all workers.
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, log_level="info",
+                workers=WORKERS, loop="uvloop", http="httptools")